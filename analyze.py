@@ -1,60 +1,87 @@
-from __future__ import division, print_function
 import sys
-import csv
 import os.path
+import concurrent.futures
 import numpy as np
-import scipy.linalg
-import rospy
-import cisstRobotPython as crp
+import scipy.optimize
 import matplotlib.pyplot as plt
-from cisstNumericalPython import nmrRegistrationRigid
-from copy import copy
+from numpy.polynomial.polynomial import polyval
 
 
 ROB_FILE = ("/home/chaitu/catkin_ws/src/cisst-saw/"
             "sawIntuitiveResearchKit/share/deprecated/dvpsm.rob")
 
-SEARCH_THRESH = 1.4
-
 # Minimum difference between residuals, used in analyze_palpation
 MIN_RESIDUAL_DIFF = 0.008
 
+# Range and step of the offset sweep, in tenths of a millimeter
+MIN_OFFSET = -200
+MAX_OFFSET = 200
+OFFSET_STEP = 10
 
-def show_tracker_point_cloud(data_file):
+# Tolerance of the refined minimum offset, in tenths of a millimeter
+OFFSET_TOLERANCE = 0.01
+
+ARM_POSITION_FIELDNAMES = [
+    "arm_position_x",
+    "arm_position_y",
+    "arm_position_z",
+]
+
+TRACKER_POSITION_FIELDNAMES = [
+    "tracker_position_x",
+    "tracker_position_y",
+    "tracker_position_z",
+]
+
+JOINT_FIELDNAMES = [f"joint_{i}_position" for i in range(6)]
+
+# Column order expected by analyze_palpation
+PALPATION_FIELDNAMES = (ARM_POSITION_FIELDNAMES + ["wrench"]
+                        + JOINT_FIELDNAMES)
+
+
+def load_columns(data_file, fieldnames):
     """
-    Plots graph of tracker point cloud/arm position point cloud
-    in addition to the transforming the tracker point cloud onto
-    the arm position point cloud
+    Loads the columns named `fieldnames` from the csv file `data_file`
+    :param str data_file The csv file to read from
+    :param list fieldnames The names of the columns to load, in order
+    :returns array with one column per name in `fieldnames`
+    :rtype numpy.ndarray
     """
-    coords = np.array([])
-    tracker_coords = np.array([])
-
+    # Columns are written by name, so resolve their indices from the header
+    # and parse the rest of the same open file in one pass
     with open(data_file, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
+        header = csvfile.readline().strip().split(',')
+        usecols = [header.index(name) for name in fieldnames]
+        return np.loadtxt(csvfile, delimiter=',', usecols=usecols, ndmin=2)
 
-        for row in reader:
-            coord = np.array([
-                float(row["arm_position_x"]),
-                float(row["arm_position_y"]),
-                float(row["arm_position_z"])
-            ])
-            coords = np.append(coords, coord)
 
-            tracker_coord = np.array([
-                float(row["tracker_position_x"]),
-                float(row["tracker_position_y"]),
-                float(row["tracker_position_z"]),
-            ])
-            tracker_coords = np.append(tracker_coords, tracker_coord)
+def load_palpation(data_file):
+    """
+    Loads a palpation csv file in the format
+    [[x0, y0, z0, wrench0, joint_0_0, ..., joint_5_0], ...]
+    """
+    return load_columns(data_file, PALPATION_FIELDNAMES)
 
-    coords = coords.reshape(-1, 3)
-    tracker_coords = tracker_coords.reshape(-1, 3)
 
-    transf, error = nmrRegistrationRigid(coords, tracker_coords)
-    rot_matrix = transf.Rotation()
-    translation = transf.Translation()
-    tracker_coords = (tracker_coords - translation).dot(rot_matrix)
-    print("Rigid Registration Error: {}".format(error))
+def show_tracker_point_cloud(data_file):
+    """
+    Plots graph of tracker point cloud/arm position point cloud
+    in addition to the transforming the tracker point cloud onto
+    the arm position point cloud
+    """
+    data = load_columns(data_file,
+                        ARM_POSITION_FIELDNAMES + TRACKER_POSITION_FIELDNAMES)
+    coords = data[:, :3]
+    tracker_coords = data[:, 3:6]
+
+    (rot_matrix, translation), error = get_rigid_registration(coords,
+                                                              tracker_coords)
+    # Only used for plotting, so single precision is enough
+    tracker_coords = tracker_coords.astype(np.float32)
+    tracker_coords -= translation.astype(np.float32)
+    tracker_coords = tracker_coords.dot(rot_matrix.astype(np.float32))
+    print(f"Rigid Registration Error: {error}")
 
     # plot transformed tracker point cloud and plot
     # arm positions
@@ -80,31 +107,17 @@ def show_palpation_point_cloud(data_file):
     """Plots the palpation point cloud
     from the csv file data_file"""
 
-    coords = np.array([])
-
-    with open(data_file, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            coord = np.array([
-                float(row["arm_position_x"]),
-                float(row["arm_position_y"]),
-                float(row["arm_position_z"])
-            ])
-            coords = np.append(coords, coord)
+    coords = load_columns(data_file, ARM_POSITION_FIELDNAMES)
 
-    coords = coords.reshape(-1, 3)
+    # Bounds of the x and y coordinates, with a margin
+    min_xy = coords[:, :2].min(axis=0) - 0.05
+    max_xy = coords[:, :2].max(axis=0) + 0.05
 
+    # Sparse grid: X is a row and Y a column, Z broadcasts to the full grid
     X, Y = np.meshgrid(
-        np.arange(
-            min(coords[:, 0])-0.05,
-            max(coords[:, 0])+0.05,
-            0.05
-        ),
-        np.arange(
-            min(coords[:, 1])-0.05,
-            max(coords[:, 1])+0.05,
-            0.05
-        )
+        np.arange(min_xy[0], max_xy[0], 0.05),
+        np.arange(min_xy[1], max_xy[1], 0.05),
+        sparse=True
     )
 
     (A, B, C), error = get_best_fit_plane(coords)
@@ -113,7 +126,8 @@ def show_palpation_point_cloud(data_file):
     # plot points and fitted surface
     fig = plt.figure()
     ax = fig.gca(projection='3d')
-    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, alpha=0.2)
+    ax.plot_surface(np.broadcast_to(X, Z.shape), np.broadcast_to(Y, Z.shape),
+                    Z, rstride=1, cstride=1, alpha=0.2)
     ax.scatter(coords[:, 0], coords[:, 1], coords[:, 2], c='r', s=20)
 
     plt.xlabel('X')
@@ -131,26 +145,47 @@ def get_best_fit_plane(pts):
     :rtype tuple(tuple(float, float, float), float)
     """
     A = np.c_[pts[:, 0], pts[:, 1], np.ones(pts.shape[0])]
-    (a, b, c), _, _, _ = scipy.linalg.lstsq(A, pts[:, 2])    # coefficients
-
-    errors = np.array([])
+    # Least squares through the 3x3 normal equations, (A^T A) x = A^T z
+    a, b, c = np.linalg.solve(A.T.dot(A), A.T.dot(pts[:, 2]))    # coefficients
 
     direction = np.array([a, b, -1])
     normal = direction / np.linalg.norm(direction)
 
-    projections = np.array([])
+    # Signed distance of every point from the plane,
+    # (a*x + b*y - z + c) / |(a, b, -1)|
+    errors = (pts - np.array([0, 0, c])).dot(normal)
+
+    return (a, b, c), np.sqrt(np.mean(errors ** 2))
+
+
+def get_rigid_registration(pts, target_pts):
+    """
+    Gets the rigid transformation from `pts` to `target_pts` using the
+    Kabsch (SVD) method, along with the registration error
+    :param numpy.ndarray pts The (N, 3) points to register
+    :param numpy.ndarray target_pts The (N, 3) points to register onto
+    :returns tuple of ((rotation, translation), error) where
+        target_pts ~= pts.dot(rotation.T) + translation
+    :rtype tuple(tuple(numpy.ndarray, numpy.ndarray), float)
+    """
+    centroid = pts.mean(axis=0)
+    target_centroid = target_pts.mean(axis=0)
+
+    # Cross-covariance of the centered point sets
+    H = (pts - centroid).T.dot(target_pts - target_centroid)
+    U, _, Vt = np.linalg.svd(H)
+
+    # Flip the last axis if needed so the result is a rotation,
+    # not a reflection
+    d = np.sign(np.linalg.det(Vt.T.dot(U.T)))
+    rotation = Vt.T.dot(np.diag([1, 1, d])).dot(U.T)
+    translation = target_centroid - rotation.dot(centroid)
 
-    for pt in pts:
-        dist = np.dot(normal, pt - np.array([0, 0, c]))
-        projection = pt - dist * normal
-        projections = np.append(projections, projection)
-        projections = projections.reshape(-1, 3)
-        errors = np.append(errors, dist)
-        # If this value is close to 0, then the distances are accurate
-        # print(A * projection[0] + B * projection[1] + c - projection[2])
+    # Root mean square distance between registered and target points
+    residuals = pts.dot(rotation.T) + translation - target_pts
+    error = np.sqrt(np.mean(np.sum(residuals ** 2, axis=1)))
 
-    return (a, b, c), np.sqrt(sum([error ** 2 for error in errors]) /
-                              len(errors))
+    return (rotation, translation), error
 
 
 def get_poly_min(pts, deg=2):
@@ -161,7 +196,8 @@ def get_poly_min(pts, deg=2):
     polyfit = np.polynomial.Polynomial.fit(pts[:, 0], pts[:, 1], deg)
     equation = polyfit.convert().coef
     x = np.arange(pts[0, 0], pts[-1, 0] + 0.0001, 0.0001)
-    y = np.zeros(x.shape)
+    # Evaluate with Horner's scheme
+    y = polyval(x, equation)
     graph = np.array([x, y])
     min_x, min_y = get_min_value(graph.T)
 
@@ -169,30 +205,38 @@ def get_poly_min(pts, deg=2):
 
 
 def get_min_value(pts):
-    y = pts[:, 1]
-    min_y = np.amin(y)
-    # Returns list of points where y == min_y
-    # choose first point as min_idx
-    min_idx = np.where(y == min_y)[0][0]
-    min_x = pts[min_idx, 0]
+    # argmin returns the first index of the minimum
+    min_idx = int(pts[:, 1].argmin())
+    min_x, min_y = pts[min_idx, :2]
     return min_x, min_y
 
 
 def get_offset_v_error(offset_v_error_filename, data_folders, tracker=False,
                        show_graph=False):
+    """
+    Sweeps joint 2 offsets over the recorded data and
+    finds the offset with the lowest error
+    :returns tuple of (offset vs error of the sweep, offset of the minimum),
+        with offsets in tenths of a millimeter
+    :rtype tuple(numpy.ndarray, float)
+    """
+
+    # Imported here so the rest of the analysis runs without ROS installed
+    import cisstRobotPython as crp
 
     rob = crp.robManipulator()
     rob.LoadRobot(ROB_FILE)
 
-    joint_set = np.array([])
     joint_sets = []
-    coords = np.array([])
     coord_set = []
 
     if tracker:
-        tracker_coords = np.array([])
         tracker_coord_set = []
 
+    fieldnames = JOINT_FIELDNAMES + ARM_POSITION_FIELDNAMES
+    if tracker:
+        fieldnames += TRACKER_POSITION_FIELDNAMES
+
     # Accepts n number of data_folders
 
     # Loop through data_folders and put joint sets into `joint_sets` variable
@@ -203,84 +247,68 @@ def get_offset_v_error(offset_v_error_filename, data_folders, tracker=False,
         else:
             data_file = os.path.join(data_folder, "plane.csv")
 
-        with open(data_file) as infile:
-            reader = csv.DictReader(infile)
-            for row in reader:
-                joints = np.array([
-                    float(row["joint_{}_position".format(joint_num)])
-                    for joint_num in range(6)
-                ])
-                joint_set = np.append(joint_set, joints)
-                coord = np.array([
-                    float(row["arm_position_x"]),
-                    float(row["arm_position_y"]),
-                    float(row["arm_position_z"])
-                ])
-                coords = np.append(coords, coord)
-                if tracker:
-                    tracker_coord = np.array([
-                        float(row["tracker_position_x"]),
-                        float(row["tracker_position_y"]),
-                        float(row["tracker_position_z"])
-                    ])
-                    tracker_coords = np.append(tracker_coords, tracker_coord)
-
-        coords = coords.reshape(-1, 3)
-        coord_set.append(coords)
-
-        joint_set = joint_set.reshape(-1, 6)
-        joint_sets.append(joint_set)
+        data = load_columns(data_file, fieldnames)
 
+        joint_sets.append(data[:, :6])
+        coord_set.append(data[:, 6:9])
+
+        if tracker:
+            tracker_coord_set.append(data[:, 9:12])
+
+    def get_error(offset):
+        """Gets the error of the data with joint 2 shifted by `offset`"""
+        fk_pt_set = []
+        # Go through each file's `joint_set` and `coords`
+        for joint_set, coords in zip(joint_sets, coord_set):
+            # Change 2nd joint by `offset` tenths of a millimeter
+            data = joint_set.copy()
+            data[:, 2] += offset / 10000
+            # One tip position per joint set
+            fk_pts = np.empty((len(data), 3))
+            for i, q in enumerate(data):
+                # Run forward kinematics on each point and get result
+                fk_pts[i] = rob.ForwardKinematics(q)[:3, 3]
+            fk_pt_set.append(fk_pts)
+
+        # Get sum of errors of all files
         if tracker:
-            tracker_coords = tracker_coords.reshape(-1, 3)
-            tracker_coord_set.append(tracker_coords)
-
-    with open(offset_v_error_filename, 'w') as outfile:
-        fk_plot = csv.DictWriter(outfile, fieldnames=["offset", "error"])
-        fk_plot.writeheader()
-        offset_v_error = np.array([])
-
-        # -2cm to 2cm
-        # In tenths of a millimeter
-        for num, offset in enumerate(range(-200, 200, 1)):
-            fk_pt_set = []
-            # Go through each file's `joint_set` and `coords`
-            for joint_set, coords in zip(joint_sets, coord_set):
-                data = joint_set.copy()
-                fk_pts = np.array([])
-                for q in data:
-                    # Change 2nd joint by `offset` tenths of a millimeter
-                    q[2] += offset / 10000
-                    # Run forward kinematics on each point and get result
-                    fk_pts = np.append(fk_pts, rob.ForwardKinematics(q)[:3, 3])
-                fk_pts = fk_pts.reshape((-1, 3))
-                fk_pt_set.append(fk_pts)
-
-            # Get sum of errors of all files
-            if tracker:
-                # Use rigid registration if tracker is used
-                error = sum([
-                    # Get error of rigid registration
-                    nmrRegistrationRigid(coords_fk, coords_tracker)[1]
-                    for coords_fk, coords_tracker in zip(fk_pt_set,
-                                                         tracker_coord_set)
-                ])
-            else:
-                # import pudb; pudb.set_trace()  # XXX BREAKPOINT
-                # Use plane of best fit if palpation is used
-                error = sum([
-                    get_best_fit_plane(coords_fk)[1]  # Returns equation, err
-                    for coords_fk in fk_pt_set
-                ])
-
-            # Add new points
-            offset_v_error = np.append(offset_v_error,
-                                       np.array([offset, error]))
-
-            # Write plots in tenths of millimeters
-            fk_plot.writerow({"offset": offset, "error": error})
-
-    offset_v_error = offset_v_error.reshape(-1, 2)
+            # Use rigid registration if tracker is used
+            return sum([
+                # Get error of rigid registration
+                get_rigid_registration(coords_fk, coords_tracker)[1]
+                for coords_fk, coords_tracker in zip(fk_pt_set,
+                                                     tracker_coord_set)
+            ])
+        else:
+            # Use plane of best fit if palpation is used
+            return sum([
+                get_best_fit_plane(coords_fk)[1]  # Returns equation, err
+                for coords_fk in fk_pt_set
+            ])
+
+    # -2cm to 2cm
+    # In tenths of a millimeter, coarse enough to only locate the minimum
+    offsets = range(MIN_OFFSET, MAX_OFFSET, OFFSET_STEP)
+    offset_v_error = np.empty((len(offsets), 2))
+
+    for num, offset in enumerate(offsets):
+        # Add new points
+        offset_v_error[num] = offset, get_error(offset)
+
+    # Write plots in tenths of millimeters
+    np.savetxt(offset_v_error_filename, offset_v_error, fmt=('%d', '%.17g'),
+               delimiter=',', header="offset,error", comments='')
+
+    # Refine the minimum within a step of the sweep's minimum,
+    # where the error is assumed to be unimodal
+    coarse_min_offset = get_min_value(offset_v_error)[0]
+    min_offset = scipy.optimize.minimize_scalar(
+        get_error,
+        bounds=(max(coarse_min_offset - OFFSET_STEP, MIN_OFFSET),
+                min(coarse_min_offset + OFFSET_STEP, MAX_OFFSET)),
+        method='bounded',
+        options={'xatol': OFFSET_TOLERANCE}
+    ).x
 
     if show_graph:
         plt.plot(offset_v_error[:, 0], offset_v_error[:, 1])
@@ -289,7 +317,7 @@ def get_offset_v_error(offset_v_error_filename, data_folders, tracker=False,
     # Convert from tenths of a millimeter to meters
     # offset_v_error[:, 0] /= 10000
 
-    return offset_v_error
+    return offset_v_error, min_offset
 
 
 def analyze_palpations(folder, show_palpations=False):
@@ -297,14 +325,16 @@ def analyze_palpations(folder, show_palpations=False):
     Analyze set of palpations with the option
     to show graph of palpations
     """
+    import rospy
+
     data = []
 
     if not os.path.isdir(folder):
-        print("There must be a folder at {}".format(folder))
+        print(f"There must be a folder at {folder}")
         sys.exit(1)
 
     # Ignore non-palpation files, e. g. offset_v_error.csv or plane.csv
-    palpation_files = sorted(np.array([
+    palpation_files = np.array(sorted([
         f
         for f in os.listdir(folder)
         if f.startswith("palpation")
@@ -319,102 +349,69 @@ def analyze_palpations(folder, show_palpations=False):
 
     row_len = (dim + 1) // 2
 
-    for row_idx, row in enumerate(palpation_files):
+    if show_palpations:
+        results = []
+
+        for row_idx, row in enumerate(palpation_files):
 
-        if show_palpations:
             fig, ax = plt.subplots(2, row_len)
 
-        for col_idx, palpation_file in enumerate(row):
-
-            with open(os.path.join(folder, palpation_file)) as infile:
-                reader = csv.DictReader(infile)
-                pos_v_wrench = []
-                for row in reader:
-                    joints = [
-                        float(row["joint_{}_position".format(i)])
-                        for i in range(6)
-                    ]
-
-                    pos_v_wrench.append((
-                        [
-                            float(row["arm_position_x"]),
-                            float(row["arm_position_y"]),
-                            float(row["arm_position_z"]),
-                            float(row["wrench"])
-                        ]
-                        + joints
-                    ))
-
-                if show_palpations:
-                    # Subplot row and column
-                    sp_row = col_idx // row_len
-                    sp_col = col_idx % row_len
-
-                    pos, joints = analyze_palpation(pos_v_wrench,
-                                                    ax=ax[sp_row, sp_col])
-
-                pos, joints = analyze_palpation(pos_v_wrench,
-                                                ax=None)
-
-                if pos is None:
-                    rospy.logwarn("Didn't get enough data;"
-                                  "disregarding point and continuing to next")
-                    continue
-
-                data_dict = {
-                    "arm_position_x": pos[0],
-                    "arm_position_y": pos[1],
-                    "arm_position_z": pos[2],
-                }
-
-                for joint_num, joint_pos in enumerate(joints):
-                    data_dict.update({
-                        "joint_{}_position".format(joint_num): joint_pos
-                    })
-
-                data.append(copy(data_dict))
-
-        if show_palpations:
+            for col_idx, palpation_file in enumerate(row):
+                pos_v_wrench = load_palpation(os.path.join(folder,
+                                                           palpation_file))
+
+                # Subplot row and column
+                sp_row = col_idx // row_len
+                sp_col = col_idx % row_len
+
+                results.append(analyze_palpation(pos_v_wrench,
+                                                 ax=ax[sp_row, sp_col]))
+
             plt.show()
+    else:
+        # Palpations are independent of each other,
+        # so analyze them in parallel
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            results = list(executor.map(analyze_palpation_file, [
+                os.path.join(folder, palpation_file)
+                for palpation_file in palpation_files.flat
+            ]))
+
+    for result in results:
+        if result is None:
+            rospy.logwarn("Didn't get enough data;"
+                          "disregarding point and continuing to next")
+            continue
+
+        pos, joints = result
+        data.append(np.concatenate((pos, joints)))
 
     # Output contents of `data` to csv
-    with open(os.path.join(folder, "plane.csv"), 'w') as outfile:
-        csvfile = csv.DictWriter(outfile, fieldnames=data[0].keys())
-        csvfile.writeheader()
-        csvfile.writerows(data)
+    fieldnames = ARM_POSITION_FIELDNAMES + JOINT_FIELDNAMES
+    np.savetxt(os.path.join(folder, "plane.csv"),
+               np.reshape(data, (-1, len(fieldnames))),
+               delimiter=',', header=','.join(fieldnames), comments='')
+
+
+def analyze_palpation_file(palpation_file):
+    """
+    Loads and analyzes the palpation stored in `palpation_file`
+    :returns tuple of (pos, joints), or None if there wasn't enough data
+    """
+    return analyze_palpation(load_palpation(palpation_file))
 
 
 def analyze_palpation(pos_v_wrench, ax=None):
     """
     Analyze palpation with the option to show graph
     """
-    data_moving = []
-    data_contact = []
-
     # Sort pos_v_wrench based on z-position
-    pos_v_wrench = np.array(sorted(pos_v_wrench, key=lambda t: t[2]))
+    pos_v_wrench = np.asarray(pos_v_wrench)
+    pos_v_wrench = pos_v_wrench[pos_v_wrench[:, 2].argsort(kind='mergesort')]
     z_v_wrench = pos_v_wrench[:, 2:4]
 
     # Separate points into periods of contact or movement of arm
-    # (data_moving or data_contact)
-    moving = False
-    for i in range(1, len(z_v_wrench)):
-        # Seperate sections based on derivative (Maybe will change this method)
-        # If derivative is low negative in the beginning,
-        #   arm is in contact
-        # Else, the arm is moving
-        deriv = derivative(z_v_wrench[i], z_v_wrench[i-1])
-        if deriv < -300:
-            if not moving:
-                data_contact.append(z_v_wrench[i-1])
-            else:
-                data_moving.append(z_v_wrench[i-1])
-        else:
-            moving = True
-            data_moving.append(z_v_wrench[i-1])
-
-    data_moving = np.array(data_moving)
-    data_contact = np.array(data_contact)
+    data_contact, data_moving = split_palpation(z_v_wrench)
 
     if len(data_moving) == 0 or len(data_contact) == 0:
         return None
@@ -494,41 +491,23 @@ def analyze_palpation(pos_v_wrench, ax=None):
     return pos, joints
 
 
-def analyze_palpation_threshold(
-        pos_v_wrench, thresh=None,
-        show_graph=False):
+def split_palpation(z_v_wrench):
     """
-    Analyze palpation by searching through `pos_v_wrench` until the wrench
-    is greater than `thresh`
-    :param numpy.ndarray pos_v_wrench A numpy array in the format
-        [[x0, y0, z0, wrench0], [x1, y1, z1, wrench1], ...]
-    :param thresh
-    :type thresh float or int or None
+    Separates a palpation sorted by z-position into periods of contact
+    and movement of the arm
+    :param numpy.ndarray z_v_wrench A numpy array in the format
+        [[z0, wrench0], ...], sorted by z
+    :returns tuple of (data_contact, data_moving)
+    :rtype tuple(numpy.ndarray, numpy.ndarray)
     """
-    if thresh is None:
-        thresh = SEARCH_THRESH
-
-    # Add checker if wrench ever reaches threshold
-    pos_v_wrench = np.array(sorted(pos_v_wrench, key=lambda t: t[2]))
-    for i in range(len(pos_v_wrench)):
-        if pos_v_wrench[i, 3] > thresh:
-            # Get average of the closest two pos and joints
-            pos = (pos_v_wrench[i, :3] + pos_v_wrench[i-1, :3]) / 2
-            joints = (pos_v_wrench[i, 4:] + pos_v_wrench[i-1, 4:]) / 2
-            break
-
-    # Plot z vs wrench onto a window, image, or both
-    if show_graph:
-        # Plot z vs wrench
-        plt.plot(pos_v_wrench[:, 2], pos_v_wrench[:, 3], '-', color="red")
-
-        # Plot point at threshold
-        plt.plot(pos[2], thresh)
-
-        plt.show()
-
-    return pos, joints
+    # Seperate sections based on derivative (Maybe will change this method)
+    # If derivative is low negative in the beginning,
+    #   arm is in contact
+    # Else, the arm is moving from that point onwards
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derivs = np.diff(z_v_wrench[:, 1]) / np.diff(z_v_wrench[:, 0])
 
+    moving = ~(derivs < -300)
+    first_moving = int(moving.argmax()) if moving.any() else len(derivs)
 
-def derivative(p1, p2):
-    return (p2[1] - p1[1]) / (p2[0] - p1[0])
+    return z_v_wrench[:first_moving], z_v_wrench[first_moving:-1]
@@ -1,17 +1,21 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
-from __future__ import print_function, division
 import sys
 import os.path
-from copy import copy
 import time
 import argparse
 import xml.etree.ElementTree as ET
 import rospy
-from analyze import (get_offset_v_error, get_min_value, analyze_palpations,
+from analyze import (get_offset_v_error, analyze_palpations,
                      show_tracker_point_cloud, show_palpation_point_cloud)
 
 
+VOLTS_TO_POS_SI_PATH = ("./Robot/"
+                        "Actuator[@ActuatorID='2']/"
+                        "AnalogIn/"
+                        "VoltsToPosSI")
+
+
 def parse_info(filename):
     info = {}
     if os.path.exists(filename):
@@ -37,57 +41,52 @@ def parse_record(args):
     for i in range(args.number):
         if args.tracker is not None:
             from tracker_recording import TrackerRecording
-            recording = TrackerRecording(args.arm, args.tracker)
+            recording = TrackerRecording(args.arm, args.config_file,
+                                          args.tracker)
+            recording.prepare()
             joint_set = list(recording.gen_wide_joint_positions())
             print("Starting recording")
             time.sleep(0.5)
             recording.record_joints(joint_set, verbose=args.verbose)
             recording.output_to_csv()
             recording.output_info()
-            print("run `./calibrate.py analyze {}`\n"
-                "    to analyze the recorded data points."
-                .format(recording.folder))
+            print(f"run `./calibrate.py analyze {recording.folder}`\n"
+                "    to analyze the recorded data points.")
         else:
             from plane_recording import PlaneRecording
 
             if not args.single_palpation:
                 # Full plane palpation
-                recording = PlaneRecording(args.arm)
+                recording = PlaneRecording(args.arm, args.config_file)
+                recording.prepare()
                 pts = recording.get_corners()
-                goal = copy(pts[2])
-                goal.p[2] += 0.10
-                recording.arm.move(goal)
-                goal = copy(pts[0])
+                recording.arm.move(recording.lift(pts[2], 0.10))
                 recording.arm.home()
-                goal.p[2] += 0.090
-                recording.arm.move(goal)
-                goal.p[2] -= 0.085
-                recording.arm.move(goal)
+                recording.arm.move(recording.lift(pts[0], 0.090))
+                recording.arm.move(recording.lift(pts[0], 0.005))
                 recording.record_points(pts, args.samples, verbose=args.verbose)
-                print(("Run `./calibrate.py analyze {}`\n"
+                print(f"Run `./calibrate.py analyze {recording.folder}`\n"
                     "to analyze the recorded data points")
-                    .format(recording.folder))
                 recording.output_info()
             else:
                 # Single palpation
-                recording = PlaneRecording(args.arm)
+                recording = PlaneRecording(args.arm, args.config_file)
+                recording.prepare()
                 print(("Position the arm at the point you want to palpate at,"
                     "then press enter."),
                     end=' ')
                 sys.stdin.readline()
-                goal = recording.arm.get_current_position()
-                goal.p[2] += 0.05
-                recording.arm.move(goal)
-                goal.p[2] -= 0.045
-                recording.arm.move(goal)
+                start = recording.arm.get_current_position()
+                recording.arm.move(recording.lift(start, 0.05))
+                recording.arm.move(recording.lift(start, 0.005))
                 palp_fn = os.path.join(recording.folder, "single_palpation.csv")
                 pos_v_wrench = recording.palpate(palp_fn)
-                if not pos_v_wrench:
+                if pos_v_wrench is None:
                     rospy.logerr("Didn't reach surface; closing program")
                     sys.exit(1)
                 arm_position_z = recording.analyze_palpation(pos_v_wrench,
                                                             show_graph=True)
-                print("Using {}".format(arm_position_z))
+                print(f"Using {arm_position_z}")
 
 
 def parse_analyze(args):
@@ -121,32 +120,29 @@ def parse_analyze(args):
 
     offset_v_error_filename = os.path.join(folder, "offset_v_error.csv")
 
-    offset_v_error = get_offset_v_error(
+    # Get offset correction in tenths of millimeter
+    # from the minimum of the offset vs error graph
+    offset_v_error, offset_correction = get_offset_v_error(
         offset_v_error_filename,
         args.data_folder, is_tracker,
         args.view_offset_error or args.view_all
     )
 
-    # Get offset correction in tenths of millimeter
-    # by getting x value of the abs. minimum of the graph
-    offset_correction = get_min_value(offset_v_error)[0]
-
     # Convert correction from tenths of millimeter to milimeter
     offset_correction /= 10
 
-    print("Offset correction: {}mm".format(offset_correction))
+    print(f"Offset correction: {offset_correction}mm")
     print("Write to config file? (y/N) ", end=' ')
     write_to_file_input = sys.stdin.readline().strip().lower()
 
     if write_to_file_input == 'y':
         if os.path.exists(info["Config File"]):
             print("Writing offset...")
-            tree = ET.parse(info["Config File"])
+            # Keep the config file's comments when writing it back
+            parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+            tree = ET.parse(info["Config File"], parser)
             root = tree.getroot()
-            xpath_search_results = root.findall("./Robot/"
-                                                "Actuator[@ActuatorID='2']/"
-                                                "AnalogIn/"
-                                                "VoltsToPosSI")
+            xpath_search_results = root.findall(VOLTS_TO_POS_SI_PATH)
             if len(xpath_search_results) == 1:
                 VoltsToPosSI = xpath_search_results[0]
             else:
@@ -155,11 +151,9 @@ def parse_analyze(args):
             current_offset = float(VoltsToPosSI.get("Offset"))
             VoltsToPosSI.set("Offset", str(offset_correction + current_offset))
             tree.write(info["Config File"])
-            print(("Wrote offset: {}mm (Current offset) "
-                "+ {}mm (Offset correction) "
-                "= {}mm (Written offset)")
-                .format(current_offset, offset_correction,
-                        offset_correction + current_offset))
+            print(f"Wrote offset: {current_offset}mm (Current offset) "
+                f"+ {offset_correction}mm (Offset correction) "
+                f"= {offset_correction + current_offset}mm (Written offset)")
         else:
             print("Error: File does not exist")
             sys.exit(1)
@@ -206,8 +200,9 @@ if __name__ == "__main__":
         default=False
     )
     parser_record.add_argument(
-        "-n", "--number",
-        help="run n number of times",
+        "-N", "--number",
+        help="run N number of times",
+        default=1,
         type=int,
     )
     parser_record.set_defaults(func=parse_record)
@@ -1,5 +1,29 @@
+import os
+import glob
 import unittest
 import numpy as np
+from analyze import get_rigid_registration, load_palpation, split_palpation
+
+
+def split_palpation_loop(z_v_wrench):
+    """The point by point contact/moving split split_palpation replaced"""
+    data_moving = []
+    data_contact = []
+    moving = False
+    for i in range(1, len(z_v_wrench)):
+        deriv = ((z_v_wrench[i-1][1] - z_v_wrench[i][1])
+                 / (z_v_wrench[i-1][0] - z_v_wrench[i][0]))
+        if deriv < -300:
+            if not moving:
+                data_contact.append(z_v_wrench[i-1])
+            else:
+                data_moving.append(z_v_wrench[i-1])
+        else:
+            moving = True
+            data_moving.append(z_v_wrench[i-1])
+    return (np.array(data_contact).reshape(-1, 2),
+            np.array(data_moving).reshape(-1, 2))
+
 
 class TestRecording(unittest.TestCase):
 
@@ -17,3 +41,80 @@ class TestRecording(unittest.TestCase):
             B * projection[1] +
             C - projection[2], 0
         )
+
+
+class TestAnalyze(unittest.TestCase):
+
+    def setUp(self):
+        self.pts = np.random.RandomState(0).uniform(-0.1, 0.1, (50, 3))
+
+    def test_rigid_registration(self):
+        angle = np.deg2rad(30)
+        rotation = np.array([
+            [np.cos(angle), -np.sin(angle), 0],
+            [np.sin(angle),  np.cos(angle), 0],
+            [0,              0,             1],
+        ])
+        translation = np.array([0.01, -0.02, 0.3])
+        target_pts = self.pts.dot(rotation.T) + translation
+
+        (found_rotation, found_translation), error = get_rigid_registration(
+            self.pts, target_pts
+        )
+
+        np.testing.assert_allclose(found_rotation, rotation, atol=1e-12)
+        np.testing.assert_allclose(found_translation, translation, atol=1e-12)
+        self.assertAlmostEqual(error, 0)
+        # show_tracker_point_cloud maps the targets back onto the points
+        np.testing.assert_allclose(
+            (target_pts - found_translation).dot(found_rotation),
+            self.pts, atol=1e-12
+        )
+
+    def test_rigid_registration_reflection(self):
+        # A mirror image is best matched by a reflection,
+        # which must not be returned as the rotation
+        target_pts = self.pts * np.array([1, 1, -1])
+
+        (rotation, _), error = get_rigid_registration(self.pts, target_pts)
+
+        self.assertAlmostEqual(np.linalg.det(rotation), 1)
+        np.testing.assert_allclose(rotation.dot(rotation.T), np.eye(3),
+                                   atol=1e-12)
+        self.assertGreater(error, 0)
+
+    def assert_split_matches_loop(self, z_v_wrench):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = split_palpation_loop(z_v_wrench)
+        for part, expected_part in zip(split_palpation(z_v_wrench),
+                                       expected):
+            np.testing.assert_array_equal(part, expected_part)
+
+    def test_split_palpation(self):
+        palpation_files = glob.glob(os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data", "PSM1_2019-07-26_11-48-56", "palpation_*.csv"
+        ))
+        self.assertTrue(palpation_files)
+        for palpation_file in palpation_files:
+            pos_v_wrench = load_palpation(palpation_file)
+            pos_v_wrench = pos_v_wrench[
+                pos_v_wrench[:, 2].argsort(kind='mergesort')
+            ]
+            self.assert_split_matches_loop(pos_v_wrench[:, 2:4])
+
+    def test_split_palpation_no_contact(self):
+        z_v_wrench = np.column_stack((np.linspace(0, 0.01, 10),
+                                      np.linspace(0, 1, 10)))
+        data_contact, data_moving = split_palpation(z_v_wrench)
+        self.assertEqual(len(data_contact), 0)
+        self.assertEqual(len(data_moving), 9)
+        self.assert_split_matches_loop(z_v_wrench)
+
+    def test_split_palpation_all_contact(self):
+        z_v_wrench = np.column_stack((np.linspace(0, 0.01, 10),
+                                      np.linspace(0, -100, 10)))
+        data_contact, data_moving = split_palpation(z_v_wrench)
+        self.assertEqual(len(data_contact), 9)
+        self.assertEqual(len(data_moving), 0)
+        self.assert_split_matches_loop(z_v_wrench)
@@ -5,34 +5,46 @@ from sensor_msgs.msg import PointCloud
 
 class Marker:
 
+    BUFFER_SIZE = 256
+
     def __init__(self, ros_namespace):
         self.ros_namespace = ros_namespace
+        # Ring buffer of the latest good samples and their receipt times
+        self._times = np.zeros(self.BUFFER_SIZE)
+        self._coords = np.zeros((self.BUFFER_SIZE, 3))
+        self._index = 0
+        self.latest_time = 0.0
         self.subscriber = rospy.Subscriber(self.ros_namespace, PointCloud, self.callback)
-        self._coord = np.zeros((3))
-        self.bad_callback = False
         self.n_bad_callbacks = 0
         self.total_points = []
 
     def callback(self, data):
         self.total_points = data.points
         if len(data.points) > 1:
-            self.bad_callback = True
-            rospy.logwarn("Too many points received: {} points:\n{}".format(len(self.total_points), self.total_points))
+            rospy.logwarn(f"Too many points received: {len(self.total_points)} points:\n{self.total_points}")
         elif len(data.points) == 0:
-            self.bad_callback = True
             rospy.logwarn("No points were received")
         else:
-            self.bad_callback = False
-            self._coord = np.array(
-                [data.points[0].x, data.points[0].y, data.points[0].z],
-                dtype=np.float64
-            )
+            # Write into the buffer instead of allocating an array
+            point = data.points[0]
+            i = self._index % self.BUFFER_SIZE
+            now = rospy.get_time()
+            self._coords[i, 0] = point.x
+            self._coords[i, 1] = point.y
+            self._coords[i, 2] = point.z
+            self._times[i] = now
+            self._index += 1
+            # Only announce the sample once it is in the buffer
+            self.latest_time = now
 
-    def get_current_position(self):
-        if self.bad_callback:
-            rospy.logerr("There was a bad callback (there must be only one point received)\n"
-                         "Instead received len {}:\n{}".format(len(self.total_points),
-                                                              self.total_points))
+    def get_position_since(self, start_time):
+        """Average the good samples received since start_time
+        :param float start_time ROS time from which to use samples
+        :returns mean position of the samples, or None if there are none
+        :rtype numpy.ndarray"""
+        recent = self._times >= start_time
+        if not recent.any():
+            rospy.logerr(f"No good points received since {start_time}")
             self.n_bad_callbacks += 1
-        else:
-            return self._coord
+            return None
+        return self._coords[recent].mean(axis=0)
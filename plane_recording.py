@@ -1,11 +1,12 @@
-from __future__ import print_function, division
 import sys
 import os.path
-import csv
 import time
+import threading
+import numpy as np
 import PyKDL
 import rospy
-from record import Recording
+from geometry_msgs.msg import WrenchStamped
+from recording import Recording, Accumulator
 
 class PlaneRecording(Recording):
 
@@ -15,6 +16,40 @@ class PlaneRecording(Recording):
 
     SEARCH_THRESH = 1.4
 
+    # How far to move down looking for the surface, in meters, and in
+    # steps of how far, which bounds how far the arm can pass the surface
+    SEARCH_DEPTH = 0.06
+    SEARCH_STEP = 0.001
+    # How long to wait for the wrench after each step, in seconds
+    SEARCH_WAIT = 0.1
+
+    # The wrench estimate is noisy while the arm accelerates, so contact
+    # needs this many consecutive wrench samples over CONTACT_THRESH
+    CONTACT_SAMPLES = 3
+
+    def prepare(self):
+        super().prepare()
+        # Set by _wrench_callback once the arm is in contact
+        self._contact = threading.Event()
+        # Latest z force, kept up to date by _wrench_callback
+        self._fz = 0.0
+        # Number of consecutive samples over CONTACT_THRESH
+        self._n_contact_samples = 0
+        self._wrench_subscriber = rospy.Subscriber(
+            f"/dvrk/{self.robot_name}/wrench_body_current",
+            WrenchStamped,
+            self._wrench_callback
+        )
+
+    def _wrench_callback(self, data):
+        self._fz = data.wrench.force.z
+        if self._fz > self.CONTACT_THRESH:
+            self._n_contact_samples += 1
+            if self._n_contact_samples >= self.CONTACT_SAMPLES:
+                self._contact.set()
+        else:
+            self._n_contact_samples = 0
+
     def get_corners(self):
         "Gets input from user to get three corners of the plane"
         pts = []
@@ -37,14 +72,23 @@ class PlaneRecording(Recording):
 
         self.info["points"] = [pt.p for pt in pts]
 
+        # Precompute the grid of positions, grid[row, col] = [x, y, z]
+        corners = np.array([[pt.p[0], pt.p[1], pt.p[2]] for pt in pts])
+        steps = np.linspace(0, 1, nsamples)
 
-        goal = PyKDL.Frame(self.ROT_MATRIX)
+        # For each row, store 2 vectors as the right side and left side
+        row_direction = corners[2] - corners[1]
+        rightsides = corners[1] + steps[:, None] * row_direction
+        leftsides = corners[0] + steps[:, None] * row_direction
 
-        for row in range(nsamples):
-            # For each row, store 2 vectors as the right side and left side
-            rightside = pts[1].p + row / (nsamples - 1) * (pts[2].p - pts[1].p)
-            leftside = pts[0].p + row / (nsamples - 1) * (pts[2].p - pts[1].p)
+        # Move from left side to right side in steps
+        grid = (leftsides[:, None, :]
+                + steps[None, :, None] * (rightsides - leftsides)[:, None, :])
+
+        # Start each palpation above the surface
+        grid[:, :, 2] += 0.01
 
+        for row in range(nsamples):
             # Switch j from increasing to decreasing
             # based on if the row is even or odd
             print("moving arm to row ", row)
@@ -56,27 +100,21 @@ class PlaneRecording(Recording):
             for col in range(*args):
                 print("\tmoving arm to column ", col)
 
-                # Move from right side to left side or vice versa in steps
-                goal = PyKDL.Frame(self.ROT_MATRIX)
-                goal.p = leftside + (col
-                                     / (nsamples - 1)
-                                     * (rightside - leftside))
-
-                # Move arm up before starting palpation
-                goal.p[2] += 0.01
-                self.arm.move(goal)
+                # Move arm above the point before starting palpation
+                self.arm.move(PyKDL.Frame(self.ROT_MATRIX,
+                                          PyKDL.Vector(*grid[row, col])))
 
                 # Store palpation in a csv file
                 palpate_file = os.path.join(
                     self.folder,
-                    "palpation_{}_{}.csv".format(row, col)
+                    f"palpation_{row}_{col}.csv"
                 )
 
                 # Returns a numpy array containing
                 # the position,joint angles vs the wrench
                 pos_v_wrench = self.palpate(palpate_file)
 
-                if not pos_v_wrench:
+                if pos_v_wrench is None:
                     rospy.logerr("Didn't reach surface. Closing program")
                     sys.exit(1)
 
@@ -92,47 +130,51 @@ class PlaneRecording(Recording):
 
     def palpate(self, output_file):
         """Move down until wrenchs act on the motor in the z direction,
-        then record position, joints, and wrench body of the robot"""
+        then record position, joints, and wrench body of the robot
+        :returns array in the format [[x0, y0, z0, wrench0, joints0...], ...]
+            or None if the surface wasn't reached"""
 
         time.sleep(0.2)
         initial = self.arm.get_desired_position()
         goal = self.arm.get_desired_position()
 
-        # Store z-position and wrench in pos_v_wrench
-        pos_v_wrench = []
-        MM = 0.001
+        # Store position, wrench, and joints in pos_v_wrench
+        pos_v_wrench = Accumulator(10)
         TENTH_MM = 0.0001
 
-        # Calculate number of steps required
-        # to move 2 cm with an increment of 1 mm
-        STEPS_MM = int(0.06/MM)
-
         # Calculate number of steps required
         # to move 4 mm with an increment of 0.1 mm
         STEPS_TENTH_MM = int(0.010/TENTH_MM)
 
-        for i in range(STEPS_MM):
-            goal.p[2] -= MM
+        # Move down in short steps until the wrench callback reports contact
+        self._contact.clear()
+        for i in range(int(round(self.SEARCH_DEPTH / self.SEARCH_STEP))):
+            goal.p[2] -= self.SEARCH_STEP
             self.arm.move(goal)
-            time.sleep(0.1)
-            if self.arm.get_current_wrench_body()[2] > self.CONTACT_THRESH:
-                # Record initial contact
-                goal.p = self.arm.get_current_position().p
+            if self._contact.wait(self.SEARCH_WAIT):
                 break
-            elif i == STEPS_MM - 1:
-                return False
+        else:
+            self.arm.move(initial)
+            return None
+
+        # Record initial contact and hold there
+        # Track the position as floats and only build frames to move
+        rotation = goal.M
+        contact = self.arm.get_current_position().p
+        x, y, z = contact[0], contact[1], contact[2]
+        self.arm.move(PyKDL.Frame(rotation, PyKDL.Vector(x, y, z)))
 
         # move arm 3mm up
-        goal.p[2] += 0.003
+        z += 0.003
 
         time.sleep(0.5)
-        self.arm.move(goal)
+        self.arm.move(PyKDL.Frame(rotation, PyKDL.Vector(x, y, z)))
 
         for i in range(STEPS_TENTH_MM): # in tenths of millimeters
-            goal.p[2] -= TENTH_MM
-            self.arm.move(goal)
+            z -= TENTH_MM
+            self.arm.move(PyKDL.Frame(rotation, PyKDL.Vector(x, y, z)))
             time.sleep(0.4)
-            wrench = self.arm.get_current_wrench_body()[2]
+            wrench = self._fz
             pos = self.arm.get_current_position().p
             joints = self.arm.get_current_joint_position()
             # Add position, wrench
@@ -145,11 +187,10 @@ class PlaneRecording(Recording):
                 break
             elif i == STEPS_TENTH_MM - 1:
                 print("wasn't able to recheck")
-                return False
+                return None
 
-        outfile = open(output_file, 'w')
         fieldnames = [
-            "joint_{}_position".format(i)
+            f"joint_{i}_position"
             for i in range(6)
         ]
         fieldnames += [
@@ -158,25 +199,15 @@ class PlaneRecording(Recording):
             "arm_position_z",
             "wrench"
         ]
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        csv_dict = []
-        for i, items in enumerate(pos_v_wrench):
-            x, y, z, f = items[:4]
-            joints = items[4:]
-            csv_dict.append({
-                "joint_0_position": joints[0],
-                "joint_1_position": joints[1],
-                "joint_2_position": joints[2],
-                "joint_3_position": joints[3],
-                "joint_4_position": joints[4],
-                "joint_5_position": joints[5],
-                "arm_position_x": x,
-                "arm_position_y": y,
-                "arm_position_z": z,
-                "wrench": f
-            })
-        writer.writeheader()
-        writer.writerows(csv_dict)
+        pos_v_wrench = pos_v_wrench.view()
+        # Reorder [x, y, z, wrench, joints...] to match `fieldnames`
+        np.savetxt(
+            output_file,
+            np.column_stack((pos_v_wrench[:, 4:], pos_v_wrench[:, :4])),
+            delimiter=',',
+            header=','.join(fieldnames),
+            comments=''
+        )
 
         self.arm.move(initial)
 
@@ -1,13 +1,73 @@
-from __future__ import print_function, division
 import sys
 import time
 import os.path
-import numpy
+import xml.etree.ElementTree as ET
+import numpy as np
 import PyKDL
 import rospy
 import dvrk
 
-class Recording(object):
+
+def get_volts_to_pos_si_offsets(config_file):
+    """
+    Gets the offsets of every
+    ./Robot/Actuator[@ActuatorID='2']/AnalogIn/VoltsToPosSI
+    element in `config_file`, streaming the file instead of building the tree
+    :param str config_file The config file to read from
+    :rtype list(float)
+    """
+    offsets = []
+    # Elements from the root to the current element
+    path = []
+
+    for event, elem in ET.iterparse(config_file, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem)
+            continue
+
+        path.pop()
+        if (elem.tag == "VoltsToPosSI"
+                and [e.tag for e in path[1:]] == ["Robot", "Actuator",
+                                                  "AnalogIn"]
+                and path[2].get("ActuatorID") == '2'):
+            offsets.append(float(elem.get("Offset")))
+        elif elem.tag == "Actuator":
+            # Discard the finished actuator's subtree
+            elem.clear()
+
+    return offsets
+
+
+class Accumulator:
+    """
+    Array of rows that are appended one at a time,
+    doubling its preallocated capacity whenever it is full
+    """
+
+    def __init__(self, ncols, capacity=64):
+        self._buffer = np.empty((capacity, ncols))
+        self._nrows = 0
+
+    def __len__(self):
+        return self._nrows
+
+    def append(self, row):
+        if self._nrows == len(self._buffer):
+            # Copy into a new buffer rather than resizing in place,
+            # so views returned by view() stay valid
+            buffer = np.empty((2 * len(self._buffer),
+                               self._buffer.shape[1]))
+            buffer[:self._nrows] = self._buffer
+            self._buffer = buffer
+        self._buffer[self._nrows] = row
+        self._nrows += 1
+
+    def view(self):
+        """Gets the rows appended so far, without copying them"""
+        return self._buffer[:self._nrows]
+
+
+class Recording:
 
     ROT_MATRIX = PyKDL.Rotation(
         1,    0,    0,
@@ -18,32 +78,33 @@ class Recording(object):
     def __init__(self, robot_name, config_file):
         print("initializing recording for", robot_name)
         print("have a flat surface below the robot")
-        self.data = []
         self.tracker = False
         self.info = {}
         # Add checker for directory
         strdate = time.strftime("%Y-%m-%d_%H-%M-%S")
-        self.folder = os.path.join("data", "{}_{}".format(robot_name, strdate))
+        self.folder = os.path.join("data", f"{robot_name}_{strdate}")
         os.mkdir(self.folder)
-        print("Created folder at {}".format(os.path.abspath(self.folder)))
+        print(f"Created folder at {os.path.abspath(self.folder)}")
 
-        self.arm = dvrk.psm(robot_name)
-        self.home()
+        # The arm is only connected to in prepare()
+        self.robot_name = robot_name
+        self.arm = None
 
-        tree = ET.parse(config_file)
-        root = tree.getroot()
-        xpath_search_results = root.findall("./Robot/Actuator[@ActuatorID='2']"
-                                            "/AnalygIn/VoltsToPosSI")
-        if len(xpath_search_results) == 1:
-            VoltsToPosSI = xpath_search_results[0]
+        offsets = get_volts_to_pos_si_offsets(config_file)
+        if len(offsets) == 1:
+            current_offset = offsets[0]
         else:
             print("Error: There must be exactly Actuator 2")
             sys.exit(1)
 
-        current_offset = float(VoltsToPosSI.get("Offset"))
         self.info["Config File"] = config_file
         self.info["Current Offset"] = current_offset
 
+    def prepare(self):
+        """Connects to the arm and homes it before recording"""
+        self.arm = dvrk.psm(self.robot_name)
+        self.home()
+
     def home(self):
         """
         Goes to x = 0, y = 0, extends joint 2 past the cannula, and sets home
@@ -68,10 +129,20 @@ class Recording(object):
             self.arm.move_joint(goal)
         self.arm.move(self.ROT_MATRIX)
 
+    @staticmethod
+    def lift(frame, dz):
+        """
+        Gets a new frame with the orientation of `frame`
+        and its position raised by `dz` meters
+        """
+        return PyKDL.Frame(frame.M, PyKDL.Vector(frame.p[0],
+                                                 frame.p[1],
+                                                 frame.p[2] + dz))
+
     def output_info(self):
         """Output info to {folder}/info.txt"""
         self.info["Tracker"] = self.tracker
 
         with open(os.path.join(self.folder, "info.txt"), 'w') as infofile:
-            for key, val in self.info.iteritems():
-                infofile.write("{}: {}\n".format(key, val))
+            for key, val in self.info.items():
+                infofile.write(f"{key}: {val}\n")
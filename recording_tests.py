@@ -0,0 +1,176 @@
+import os
+import importlib.util
+import tempfile
+import types
+import unittest
+from unittest import mock
+import xml.etree.ElementTree as ET
+import numpy as np
+
+# These tests need the ROS/dVRK stack, so they are skipped without it
+ROS_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None
+    for name in ("rospy", "PyKDL", "dvrk", "sensor_msgs")
+)
+
+if ROS_AVAILABLE:
+    import rospy
+    from recording import get_volts_to_pos_si_offsets, Accumulator
+    from calibrate import VOLTS_TO_POS_SI_PATH
+    from marker import Marker
+    from tracker_recording import TrackerRecording
+
+
+def write_temp_file(text, suffix):
+    """Writes `text` to a temporary file and returns its path"""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, 'w') as temp_file:
+        temp_file.write(text)
+    return path
+
+
+@unittest.skipUnless(ROS_AVAILABLE, "requires the ROS/dVRK stack")
+class TestRecording(unittest.TestCase):
+
+    def get_offsets(self, config):
+        config_file = write_temp_file(config, ".xml")
+        self.addCleanup(os.remove, config_file)
+        offsets = get_volts_to_pos_si_offsets(config_file)
+        # Must agree with the lookup parse_analyze writes through
+        root = ET.parse(config_file).getroot()
+        self.assertEqual(offsets, [
+            float(elem.get("Offset"))
+            for elem in root.findall(VOLTS_TO_POS_SI_PATH)
+        ])
+        return offsets
+
+    def test_volts_to_pos_si_offsets(self):
+        offsets = self.get_offsets("""<Config>
+  <Robot Name="PSM1">
+    <Actuator ActuatorID="1">
+      <AnalogIn><VoltsToPosSI Scale="1" Offset="-1.5"/></AnalogIn>
+    </Actuator>
+    <Actuator ActuatorID="2">
+      <AnalogIn><VoltsToPosSI Scale="1" Offset="2.5"/></AnalogIn>
+    </Actuator>
+  </Robot>
+</Config>""")
+        self.assertEqual(offsets, [2.5])
+
+    def test_volts_to_pos_si_offsets_misplaced(self):
+        # VoltsToPosSI outside of Robot/Actuator[2]/AnalogIn is ignored
+        offsets = self.get_offsets("""<Config>
+  <Robot Name="PSM1">
+    <Actuator ActuatorID="2">
+      <VoltsToPosSI Scale="1" Offset="1.0"/>
+      <Other><AnalogIn><VoltsToPosSI Offset="3.0"/></AnalogIn></Other>
+    </Actuator>
+    <AnalogIn><VoltsToPosSI Scale="1" Offset="4.0"/></AnalogIn>
+  </Robot>
+  <Actuator ActuatorID="2">
+    <AnalogIn><VoltsToPosSI Scale="1" Offset="5.0"/></AnalogIn>
+  </Actuator>
+</Config>""")
+        self.assertEqual(offsets, [])
+
+    def test_volts_to_pos_si_offsets_duplicate(self):
+        offsets = self.get_offsets("""<Config>
+  <Robot Name="PSM1">
+    <Actuator ActuatorID="2">
+      <AnalogIn><VoltsToPosSI Scale="1" Offset="1.0"/></AnalogIn>
+    </Actuator>
+    <Actuator ActuatorID="2">
+      <AnalogIn><VoltsToPosSI Scale="1" Offset="2.0"/></AnalogIn>
+    </Actuator>
+  </Robot>
+</Config>""")
+        self.assertEqual(offsets, [1.0, 2.0])
+
+    def test_accumulator_growth(self):
+        accumulator = Accumulator(2, capacity=2)
+        accumulator.append([0, 0])
+        accumulator.append([1, 1])
+        before_growth = accumulator.view()
+
+        # Appending past the capacity copies into a larger buffer
+        for i in range(2, 5):
+            accumulator.append([i, i])
+
+        self.assertEqual(len(accumulator), 5)
+        np.testing.assert_array_equal(accumulator.view(),
+                                      [[i, i] for i in range(5)])
+        # Views taken before growing still hold their rows
+        np.testing.assert_array_equal(before_growth, [[0, 0], [1, 1]])
+
+
+class FakeArm:
+    """Arm whose joints move at the given velocities"""
+
+    def __init__(self, velocities):
+        self.velocities = np.asarray(velocities)
+
+    def get_current_joint_velocity(self):
+        return self.velocities
+
+
+class StreamingMarker:
+    """Marker that always has a sample from right now"""
+
+    @property
+    def latest_time(self):
+        return rospy.get_time()
+
+
+@unittest.skipUnless(ROS_AVAILABLE, "requires the ROS/dVRK stack")
+class TestTrackerRecording(unittest.TestCase):
+
+    def setUp(self):
+        # Use wall clock time without a ROS master,
+        # restoring rospy's global state afterwards
+        self.addCleanup(rospy.rostime.set_rostime_initialized,
+                        rospy.rostime.is_rostime_initialized())
+        rospy.rostime.set_rostime_initialized(True)
+        self.recording = TrackerRecording.__new__(TrackerRecording)
+        self.recording.SETTLE_TIMEOUT = 0.2
+        self.recording.NOISE_SAMPLES = 5
+        self.recording.settle_thresholds = np.array([1e-3, 1e-3, 1e-4,
+                                                     1e-3, 1e-3, 1e-3])
+
+    def test_measure_settle_thresholds(self):
+        # Only joint 0 is noisier than its lowest threshold
+        self.recording.arm = FakeArm([-1e-2, 1e-4, -1e-5, 0, 0, 0])
+        self.recording.measure_settle_thresholds()
+        np.testing.assert_allclose(
+            self.recording.settle_thresholds,
+            [3e-2, 1e-3, 1e-4, 1e-3, 1e-3, 1e-3]
+        )
+
+    def test_wait_until_settled(self):
+        self.recording.arm = FakeArm(0.5 * self.recording.settle_thresholds)
+        self.recording.marker = StreamingMarker()
+
+        start_time = rospy.get_time()
+        settled_time = self.recording.wait_until_settled()
+        end_time = rospy.get_time()
+
+        self.assertGreaterEqual(settled_time, start_time)
+        # Settled well before the timeout
+        self.assertLess(end_time - start_time, self.recording.SETTLE_TIMEOUT)
+
+    def test_wait_until_settled_timeout(self):
+        # Only the prismatic joint keeps moving, slower than would
+        # count as moving for a revolute joint
+        self.recording.arm = FakeArm([0, 0, 5e-4, 0, 0, 0])
+        with mock.patch("rospy.Subscriber"):
+            self.recording.marker = Marker("/fake/fiducials")
+        point = types.SimpleNamespace(x=0.1, y=0.2, z=0.3)
+        self.recording.marker.callback(types.SimpleNamespace(points=[point]))
+
+        settled_time = self.recording.wait_until_settled()
+
+        # The point is still usable, from the samples before the timeout
+        np.testing.assert_allclose(
+            self.recording.marker.get_position_since(settled_time),
+            [0.1, 0.2, 0.3]
+        )
+        self.assertEqual(self.recording.marker.n_bad_callbacks, 0)
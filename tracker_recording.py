@@ -1,4 +1,3 @@
-from __future__ import print_function, division
 import sys
 import os.path
 import time
@@ -11,27 +10,106 @@ from copy import copy
 
 class TrackerRecording(Recording):
 
-    def __init__(self, robot_name, marker_namespace):
-        super(TrackerRecording, self).__init__(robot_name)
-        self.marker = Marker(marker_namespace)
+    FIELDNAMES = [
+        "arm_position_x",
+        "arm_position_y",
+        "arm_position_z",
+        "tracker_position_x",
+        "tracker_position_y",
+        "tracker_position_z",
+    ] + [f"joint_{i}_position" for i in range(6)]
+
+    # The arm counts as settled once every joint velocity is below its
+    # threshold for SETTLE_READS consecutive reads at SETTLE_RATE Hz
+    SETTLE_RATE = 200
+    SETTLE_READS = 5
+    # Lowest thresholds, in rad/s for the revolute joints and in m/s for
+    # the prismatic joint 2. Both keep the tool tip, about 0.1 m past
+    # the remote center, under 0.1 mm/s
+    SETTLE_VELOCITY = 1e-3
+    SETTLE_VELOCITY_PRISMATIC = 1e-4
+    # The thresholds are raised to this multiple of the velocity noise
+    # measured over NOISE_SAMPLES reads while the arm holds still
+    SETTLE_NOISE_FACTOR = 3
+    NOISE_SAMPLES = 100
+    SETTLE_TIMEOUT = 2.0
+    # If the arm doesn't settle in time, use the tracker samples
+    # from this many seconds before giving up, as the fixed wait did
+    SETTLE_FALLBACK_WINDOW = 0.5
+
+    def __init__(self, robot_name, config_file, marker_namespace):
+        super().__init__(robot_name, config_file)
+        self.marker_namespace = marker_namespace
+        self.marker = None
         self.tracker = True
+        self.settle_thresholds = None
+
+    def prepare(self):
+        super().prepare()
+        # Subscribe once connecting to the arm has started the ROS node
+        self.marker = Marker(self.marker_namespace)
+        # The arm holds still after homing
+        self.measure_settle_thresholds()
 
     def gen_wide_joint_positions(self, nsamples=6):
+        # Precompute each joint's sweep, forwards and backwards
+        steps = np.linspace(0, 1, nsamples)
+        q0_sweep = np.deg2rad(-40 + steps * 105)
+        q1_sweeps = (np.deg2rad(-40 + steps * 60),
+                     np.deg2rad(20 - steps * 60))
+        q2_sweeps = (.070 + steps * .150,
+                     .220 - steps * .150)
         q = np.zeros((6))
         for sample1 in range(nsamples):
-            q[0] = np.deg2rad(-40 + (sample1) / (nsamples - 1) * 105)
+            q[0] = q0_sweep[sample1]
             for sample2 in range(nsamples):
-                if sample1 % 2 == 0:
-                    q[1] = np.deg2rad(-40 + (sample2) / (nsamples - 1) * 60)
-                else:
-                    q[1] = np.deg2rad(20 - (sample2) / (nsamples - 1) * 60)
+                q[1] = q1_sweeps[sample1 % 2][sample2]
                 for sample3 in range(nsamples):
-                    if sample2 % 2 == 0:
-                        q[2] = .070 + (sample3) / (nsamples - 1) * .150
-                    else:
-                        q[2] = .220 - (sample3) / (nsamples - 1) * .150
+                    q[2] = q2_sweeps[sample2 % 2][sample3]
                     yield copy(q)
 
+    def measure_settle_thresholds(self):
+        """Sets the settle threshold of each joint from the noise
+        of its velocity while the arm holds still"""
+        rate = rospy.Rate(self.SETTLE_RATE)
+        velocities = np.empty((self.NOISE_SAMPLES, 6))
+        for i in range(self.NOISE_SAMPLES):
+            velocities[i] = self.arm.get_current_joint_velocity()
+            rate.sleep()
+        noise = np.abs(velocities).max(axis=0)
+
+        thresholds = np.full(6, self.SETTLE_VELOCITY)
+        thresholds[2] = self.SETTLE_VELOCITY_PRISMATIC
+        self.settle_thresholds = np.maximum(thresholds,
+                                            self.SETTLE_NOISE_FACTOR * noise)
+        print(f"Joint velocity noise: {noise}")
+        print(f"Settle thresholds: {self.settle_thresholds}")
+
+    def wait_until_settled(self):
+        """Wait until the arm has stopped moving and the tracker has
+        sent a point since, giving up after SETTLE_TIMEOUT seconds
+        :returns ROS time from which to use tracker samples
+        :rtype float"""
+        rate = rospy.Rate(self.SETTLE_RATE)
+        deadline = rospy.get_time() + self.SETTLE_TIMEOUT
+        still_since = None
+        still_reads = 0
+        while rospy.get_time() < deadline and not rospy.is_shutdown():
+            velocities = np.abs(self.arm.get_current_joint_velocity())
+            if np.all(velocities < self.settle_thresholds):
+                if still_reads == 0:
+                    still_since = rospy.get_time()
+                still_reads += 1
+                if (still_reads >= self.SETTLE_READS
+                        and self.marker.latest_time >= still_since):
+                    return still_since
+            else:
+                still_reads = 0
+            rate.sleep()
+        rospy.logwarn("Arm didn't settle in time; "
+                      "using the latest tracker samples")
+        return rospy.get_time() - self.SETTLE_FALLBACK_WINDOW
+
     def record_joints(self, joint_set, verbose=False):
         """Record points using tracker by controlling the joints
         of the dVRK"""
@@ -44,59 +122,63 @@ class TrackerRecording(Recording):
         start_time = time.time()
         bad_rots = 0
 
+        # Store each field as its own column, sized for every point
+        self.data = {key: np.empty(npoints) for key in self.FIELDNAMES}
+        nrecorded = 0
+
         for i, q in enumerate(joint_set):
             q[3:6] = self.arm.get_desired_joint_position()[3:6]
             self.arm.move_joint(q)
             self.arm.move(self.ROT_MATRIX)
-            time.sleep(0.5)
+            # Only use tracker samples taken once the arm has stopped
+            settled_time = self.wait_until_settled()
             rot_matrix = self.arm.get_current_position().M
-            marker_pos = self.marker.get_current_position()
+            marker_pos = self.marker.get_position_since(settled_time)
             # check difference in angle
             rot_diff = self.ROT_MATRIX * rot_matrix.Inverse()
             # if difference in angle is > 2 degrees
             if np.rad2deg(rot_diff.GetRotAngle()[0]) > 2:
-                rospy.logwarn("Disregarding bad orientation:\n{}"
-                              .format(rot_matrix))
+                rospy.logwarn(f"Disregarding bad orientation:\n{rot_matrix}")
                 bad_rots += 1
             elif marker_pos is None:
                 rospy.logwarn("Disregarding bad data received from Tracker")
             else:
                 # Add current position (from tracker and arm) to data
                 arm_coord = self.arm.get_current_position().p
-                data_dict = {
-                    "arm_position_x": arm_coord[0],
-                    "arm_position_y": arm_coord[1],
-                    "arm_position_z": arm_coord[2],
-                    "tracker_position_x": marker_pos[0],
-                    "tracker_position_y": marker_pos[1],
-                    "tracker_position_z": marker_pos[2],
-                }
                 joints = self.arm.get_current_joint_position()
-                for joint_num, joint_pos in enumerate(joints):
-                    data_dict.update({
-                        "joint_{}_position".format(joint_num): joint_pos
-                    })
-                self.data.append(data_dict)
+                values = ([arm_coord[0], arm_coord[1], arm_coord[2]]
+                          + list(marker_pos) + list(joints))
+                for key, value in zip(self.FIELDNAMES, values):
+                    self.data[key][nrecorded] = value
+                nrecorded += 1
             block = int(toolbar_width * i/(npoints - 1))
             arrows = '-' * block if block < 1 else (('-' * block)[:-1] + '>')
-            sys.stdout.write("\r[{}{}]".format(arrows,
-                                               ' ' * (toolbar_width - block)))
+            padding = ' ' * (toolbar_width - block)
+            sys.stdout.write(f"\r[{arrows}{padding}]")
             sys.stdout.flush()
 
+        # Drop the space reserved for disregarded points
+        self.data = {
+            key: column[:nrecorded] for key, column in self.data.items()
+        }
+
         end_time = time.time()
         duration = end_time - start_time
         duration_min = int(duration) // 60
         duration_sec = int(duration % 60)
-        print("Finished in {}m {}s".format(duration_min, duration_sec))
+        print(f"Finished in {duration_min}m {duration_sec}s")
         print(rospy.get_caller_id(), '<- recording complete')
-        print("Number of bad points: {}"
-              .format(self.marker.n_bad_callbacks + bad_rots))
+        n_bad_points = self.marker.n_bad_callbacks + bad_rots
+        print(f"Number of bad points: {n_bad_points}")
 
     def output_to_csv(self):
         """Outputs contents of self.data to fpath"""
         filename = "tracker_point_cloud.csv"
 
-        with open(os.path.join(self.folder, filename), 'w') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=self.data[0].keys())
-            writer.writeheader()
-            writer.writerows(self.data)
+        np.savetxt(
+            os.path.join(self.folder, filename),
+            np.column_stack([self.data[key] for key in self.FIELDNAMES]),
+            delimiter=',',
+            header=','.join(self.FIELDNAMES),
+            comments=''
+        )